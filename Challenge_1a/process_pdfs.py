@@ -1,112 +1,152 @@
 import os
 import re
 import json
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import fitz      # PyMuPDF
 import numpy as np
-from sklearn.cluster import KMeans
-import warnings
-from sklearn.exceptions import ConvergenceWarning
+try:
+    import orjson  # optional, faster JSON output
+except ImportError:
+    orjson = None
 
-# Suppress KMeans convergence warning (optional)
-warnings.filterwarnings("ignore", category=ConvergenceWarning)
+# Text-only extraction: image blocks are never used
+_DICT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+_NUM_PREFIX = re.compile(r'\d+\.?\d*')
+_NUM_ONLY = re.compile(r'\d+\.?')
 
 #-------------------------------
 # Helpers
 #-------------------------------
 def extract_spans(doc):
-    """Flatten text spans with positional and style info."""
-    spans = []
+    """Collect text spans with positional and style info, skipping page margins.
+
+    Returns the spans as parallel columns (pno, y0, x0, size arrays and
+    text, font lists) in document order, plus a count of the pages each
+    text appears on (to detect running headers/footers).
+    """
+    pnos, y0s, x0s, sizes = array('i'), array('d'), array('d'), array('d')
+    texts, fonts = [], []
+    text_count = Counter()
     for pno in range(doc.page_count):
         page = doc.load_page(pno)
-        for block in page.get_text("dict")["blocks"]:
+        page_h = page.rect.height
+        page_texts = set()
+        tp = page.get_textpage(flags=_DICT_FLAGS)
+        blocks = tp.extractDICT(cb=page.cropbox)["blocks"]
+        del tp
+        for block in blocks:
             if block["type"] != 0: continue
             for line in block["lines"]:
-                y0 = round(line["bbox"][1], 1)
+                # Skip margins (headers/footers)
+                y0 = line["bbox"][1]
+                if y0 < 30 or y0 > page_h - 30: continue
+                y0 = round(y0, 1)
                 for span in line["spans"]:
                     text = span["text"].strip()
                     if not text: continue
-                    spans.append({
-                        "pno": pno,
-                        "y0": y0,
-                        "text": text,
-                        "size": span["size"],
-                        "font": span["font"],
-                        "bbox": span["bbox"]
-                    })
-    return spans
+                    pnos.append(pno)
+                    y0s.append(y0)
+                    x0s.append(span["bbox"][0])
+                    sizes.append(span["size"])
+                    texts.append(text)
+                    fonts.append(span["font"])
+                    page_texts.add(text)
+        text_count.update(page_texts)
+    spans = {
+        "pno": np.frombuffer(pnos, dtype=np.intc),
+        "y0": np.frombuffer(y0s),
+        "x0": np.frombuffer(x0s),
+        "size": np.frombuffer(sizes),
+        "text": texts,
+        "font": fonts
+    }
+    return spans, text_count
 
 
 def cluster_font_sizes(sizes, n=4):
-    """Cluster font sizes into up to n groups and return sorted centers."""
-    unique_sizes = list(set(sizes))
-    if len(unique_sizes) < n:
-        n = len(unique_sizes)
+    """Cluster font sizes into up to n groups and return sorted centers.
+
+    Exact 1-D k-means by dynamic programming over the unique sizes,
+    weighted by how often each size occurs.
+    """
+    x, w = np.unique(np.asarray(sizes, dtype=float), return_counts=True)
+    n = min(n, len(x))
     if n == 0:
         return []
-    X = np.array(sizes).reshape(-1,1)
-    km = KMeans(n_clusters=n, random_state=42).fit(X)
-    return sorted(km.cluster_centers_.flatten())
-
-
-def map_cluster(size, centers):
-    """Map a font size to its nearest cluster index."""
-    diffs = [abs(size - c) for c in centers]
-    return int(np.argmin(diffs))
+    m = len(x)
+
+    # Prefix sums give the SSE of any run x[i:j] in O(1)
+    cw = np.concatenate(([0.0], np.cumsum(w)))
+    cwx = np.concatenate(([0.0], np.cumsum(w * x)))
+    cwx2 = np.concatenate(([0.0], np.cumsum(w * x * x)))
+
+    def sse(i, j):
+        sx = cwx[j] - cwx[i]
+        return cwx2[j] - cwx2[i] - sx * sx / (cw[j] - cw[i])
+
+    # cost[k][j]: best SSE of x[:j] in k+1 clusters; start[k][j]: where the last one begins
+    cost = np.full((n, m + 1), np.inf)
+    start = np.zeros((n, m + 1), dtype=int)
+    cost[0, 1:] = sse(0, np.arange(1, m + 1))
+    for k in range(1, n):
+        for j in range(k + 1, m + 1):
+            i = np.arange(k, j)
+            c = cost[k - 1, i] + sse(i, j)
+            b = int(np.argmin(c))
+            cost[k, j], start[k, j] = c[b], i[b]
+
+    # Backtrack cluster boundaries; centroid = weighted mean of each run
+    centers = []
+    j = m
+    for k in range(n - 1, -1, -1):
+        i = start[k, j]
+        centers.append(float((cwx[j] - cwx[i]) / (cw[j] - cw[i])))
+        j = i
+    return centers[::-1]
 
 
 def is_numbered(text):
     """True if text begins with numbering (e.g. '1.', '1.1')."""
-    return bool(re.match(r'^\d+\.?\d*', text))
+    return bool(_NUM_PREFIX.match(text))
 
 #-------------------------------
 # Core extraction
 #-------------------------------
 def extract_outline(pdf_path):
-    doc = fitz.open(pdf_path)
-    spans = extract_spans(doc)
-    if not spans:
+    with fitz.open(pdf_path) as doc:
+        spans, text_count = extract_spans(doc)
+    if not spans['text']:
         return "", []
 
-    # 1) Cluster sizes into up to 4 groups (0=smallest ... 3=largest)
-    sizes = [s['size'] for s in spans]
-    centers = cluster_font_sizes(sizes, n=4)
+    # Cluster sizes into up to 4 groups (0=smallest ... 3=largest)
+    centers = cluster_font_sizes(spans['size'], n=4)
 
-    # 2) Group spans by (page, y0)
-    lines = {}
-    for s in spans:
-        key = (s['pno'], s['y0'])
-        lines.setdefault(key, []).append(s)
+    # Nearest center per span: centers are sorted, so bisect their midpoints
+    mids = (np.array(centers[:-1]) + np.array(centers[1:])) / 2
+    clusters = np.searchsorted(mids, spans['size'])
 
-    # 3) Build mapping of text -> pages (to detect running headers/footers)
-    text_pages = {}
-    for s in spans:
-        text_pages.setdefault(s['text'], set()).add(s['pno'])
+    # Order spans by page, y0, then left to right; a line is a run of equal (page, y0)
+    order = np.lexsort((spans['x0'], spans['y0'], spans['pno']))
+    pnos, y0s = spans['pno'][order], spans['y0'][order]
+    breaks = (np.flatnonzero((np.diff(pnos) != 0) | (np.diff(y0s) != 0)) + 1).tolist()
+    pnos, y0s, clusters = pnos.tolist(), y0s.tolist(), clusters[order].tolist()
+    order = order.tolist()
+    texts, fonts = spans['text'], spans['font']
 
     headings = []
-    for (pno, y0), group in lines.items():
-        # Skip margins (headers/footers)
-        page_h = doc.load_page(pno).rect.height
-        if y0 < 30 or y0 > page_h - 30:
-            continue
-
-        # Merge spans horizontally
-        group.sort(key=lambda s: s['bbox'][0])
-        text = ' '.join(s['text'] for s in group)
-
-        # Filters: repeated headers, numeric-only, table rows
-        if len(text_pages.get(text, [])) > 2: continue
-        if re.fullmatch(r'\d+\.?', text): continue
-        if len(group) > 5: continue
-        if re.fullmatch(r'\d+', text): continue
+    for a, b in zip([0] + breaks, breaks + [len(order)]):
+        # Cheap span-level filters first, as most lines are body text: table rows
+        if b - a > 5: continue
 
         # Determine cluster indices
-        cluster_idxs = [map_cluster(s['size'], centers) for s in group]
+        cluster_idxs = clusters[a:b]
         max_c = max(cluster_idxs)
 
         # Skip smallest-sized spans unless all italic/bold
-        if any(c == 0 for c in cluster_idxs):
-            fonts = [s['font'] for s in group]
-            if not all(('Italic' in f or 'Bold' in f) for f in fonts):
+        if 0 in cluster_idxs:
+            if not all(('Italic' in fonts[i] or 'Bold' in fonts[i]) for i in order[a:b]):
                 continue
             max_c = 1  # demote stylized text to next cluster
 
@@ -114,6 +154,12 @@ def extract_outline(pdf_path):
         if max_c < 2:
             continue
 
+        # Merge spans horizontally, then filter repeated headers and numeric-only text
+        pno, y0 = pnos[a], y0s[a]
+        text = ' '.join([texts[i] for i in order[a:b]])
+        if text_count[text] > 2: continue
+        if _NUM_ONLY.fullmatch(text): continue
+
         # Assign level (e.g., 3 -> H1, 2 -> H2, etc.)
         level = f"H{len(centers) - max_c}"
         if is_numbered(text) and level != 'H1':
@@ -121,12 +167,10 @@ def extract_outline(pdf_path):
 
         headings.append({'page': pno+1, 'y': y0, 'level': level, 'text': text + ' '})
 
-    # Sort by page and position
-    headings.sort(key=lambda h: (h['page'], h['y']))
+    # Headings are already in page and position order
 
     # Extract title from top two H1 on page 1
-    p1_h1 = [h for h in headings if h['page']==1 and h['level']=='H1']
-    p1_h1 = sorted(p1_h1, key=lambda h: h['y'])[:2]
+    p1_h1 = [h for h in headings if h['page']==1 and h['level']=='H1'][:2]
     title = ''.join(h['text'] for h in p1_h1).strip()
 
     # Remove title entries from headings
@@ -137,14 +181,28 @@ def extract_outline(pdf_path):
     return title, outline
 
 
+def process_pdf(fn):
+    """Extract one input PDF's outline and write its JSON (runs in a worker)."""
+    title, outline = extract_outline(os.path.join('input', fn))
+    out = {'title': title, 'outline': outline}
+    out_path = os.path.join('output', fn.replace('.pdf','.json'))
+    # Same 2-space indented UTF-8 output with or without orjson
+    if orjson is not None:
+        with open(out_path, 'wb') as f:
+            f.write(orjson.dumps(out, option=orjson.OPT_INDENT_2))
+    else:
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+    return fn
+
+
 def process_pdfs():
     os.makedirs('output', exist_ok=True)
-    for fn in sorted(os.listdir('input')):
-        if not fn.lower().endswith('.pdf'): continue
-        title, outline = extract_outline(os.path.join('input', fn))
-        with open(os.path.join('output', fn.replace('.pdf','.json')), 'w', encoding='utf-8') as f:
-            json.dump({'title': title, 'outline': outline}, f, ensure_ascii=False, indent=4)
-        print('Processed', fn)
+    files = [fn for fn in sorted(os.listdir('input')) if fn.lower().endswith('.pdf')]
+    # Files are independent and CPU-bound: one per worker process
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        for fn in pool.map(process_pdf, files):
+            print('Processed', fn)
 
 
 if __name__ == "__main__":
@@ -16,6 +16,7 @@ import string
 import numpy as np
 from datetime import datetime
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any
 
 # Setup logging
@@ -31,19 +32,23 @@ except ImportError:
 try:
     from sklearn.feature_extraction.text import TfidfVectorizer
     from sklearn.metrics.pairwise import cosine_similarity
-    from sklearn.cluster import KMeans
 except ImportError:
     logger.error("scikit-learn not found. Please install: pip install scikit-learn")
     exit(1)
 
 # ---------- Utility Functions ----------
 
+# Text-only extraction: image blocks are never used
+_DICT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+_NOISE = re.compile(r'(?:\s|[^\w\s\.,!\?;:\-()])+')
+_WORD = re.compile(r'\b[^\W\d_]+\b')
+_SENT_END = re.compile(r'(?<=[.!?]) +')
+
 def clean_text(text: str) -> str:
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^\w\s\.,!\?;:\-()]+', ' ', text)
-    return text.strip()
+    return _NOISE.sub(' ', text).strip()
 
-stop_words = set([
+STOP_WORDS = frozenset([
     'the','a','an','and','or','but','in','on','at','to','for','of','with','by',
     'is','are','was','were','be','been','have','has','had','do','does','did',
     'will','would','could','should','this','that','these','those','i','you','he',
@@ -52,8 +57,7 @@ stop_words = set([
 ])
 
 def extract_keywords(text: str, min_length:int=3) -> List[str]:
-    words = re.findall(r"\b\w+\b", text.lower())
-    return [w for w in words if len(w)>=min_length and w not in stop_words and not w.isdigit()]
+    return [w for w in _WORD.findall(text.lower()) if len(w)>=min_length and w not in STOP_WORDS]
 
 # ---------- Document Analyzer ----------
 
@@ -66,15 +70,21 @@ class DocumentAnalyzer:
     def extract_sections(self, pdf_path:str) -> List[Dict[str,Any]]:
         doc = fitz.open(pdf_path)
         spans=[]
-        for p in range(doc.page_count):
-            page=doc.load_page(p)
-            for b in page.get_text('dict')['blocks']:
-                if b['type']!=0: continue
-                for line in b['lines']:
-                    y0=round(line['bbox'][1],1)
-                    txt=' '.join(span['text'].strip() for span in line['spans'] if span['text'].strip())
-                    if txt:
-                        spans.append({'p':p,'y':y0,'text':txt,'spans':line['spans']})
+        try:
+            for p in range(doc.page_count):
+                page=doc.load_page(p)
+                tp=page.get_textpage(flags=_DICT_FLAGS)
+                blocks=tp.extractDICT(cb=page.cropbox)['blocks']
+                del tp
+                for b in blocks:
+                    if b['type']!=0: continue
+                    for line in b['lines']:
+                        y0=round(line['bbox'][1],1)
+                        txt=' '.join([t for span in line['spans'] if (t:=span['text'].strip())])
+                        if txt:
+                            spans.append({'p':p,'y':y0,'text':txt,'spans':line['spans']})
+        finally:
+            doc.close()
         sections=[]
         current=None
         for item in sorted(spans, key=lambda x:(x['p'],x['y'])):
@@ -83,31 +93,42 @@ class DocumentAnalyzer:
             if txt.isupper() or txt.endswith(':'):
                 if current:
                     sections.append(current)
-                current={'title':clean_text(txt),'page':item['p']+1,'content':''}
+                current={'title':clean_text(txt),'page':item['p']+1,'parts':[]}
             else:
-                if current:
-                    current['content']+= ' ' + clean_text(txt)
-                else:
-                    current={'title':'Introduction','page':item['p']+1,'content':clean_text(txt)}
+                if current is None:
+                    current={'title':'Introduction','page':item['p']+1,'parts':[]}
+                current['parts'].append(txt)
         if current:
             sections.append(current)
-        doc.close()
+        for s in sections:
+            s['content']=clean_text(' '.join(s.pop('parts')))
         return [s for s in sections if len(s['content'])>20]
 
     def rank_sections(self, sections:List[Dict], persona:str, job:str)->List[Dict]:
+        if not sections:
+            return []
         docs=[s['title']+' '+s['content'] for s in sections]
         query=persona+' '+job
-        tfidf=self.vectorizer.fit_transform(docs+[query])
-        sims=cosine_similarity(tfidf[-1],tfidf[:-1]).flatten()
+        tfidf=self.vectorizer.fit_transform(docs)
+        sims=cosine_similarity(self.vectorizer.transform([query]),tfidf).ravel()
         for i,s in enumerate(sections): s['score']=sims[i]
-        ranked=sorted(sections, key=lambda x:-x['score'])[:self.max_sections]
+        # top-k by partial sort; ties at the cut and in the ranking keep document order
+        k=min(self.max_sections,len(sections))
+        if k>0:
+            kth=np.partition(sims,-k)[-k]
+            top=np.flatnonzero(sims>kth)
+            top=np.concatenate((top,np.flatnonzero(sims==kth)[:k-len(top)]))
+            top=top[np.lexsort((top,-sims[top]))]
+        else:
+            top=[]
+        ranked=[sections[i] for i in top]
         for idx,s in enumerate(ranked,1): s['importance_rank']=idx
         return ranked
 
     def extract_subsections(self, ranked:List[Dict], persona:str, job:str)->List[Dict]:
         result=[]
         for sec in ranked[:self.max_subs]:
-            sents=re.split(r'(?<=[.!?]) +', sec['content'])
+            sents=_SENT_END.split(sec['content'])
             sel=sents[:3]
             text=' '.join(sel)
             result.append({'document':sec['document'],'refined_text':text,'page_number':sec['page']})
@@ -120,12 +141,13 @@ def process_collection(path:str)->None:
     persona=cfg['persona']['role']; job=cfg['job_to_be_done']['task']
     docs=cfg['documents']
     analyzer=DocumentAnalyzer()
+    pdfs=[os.path.join(path,'PDFs',d['filename']) for d in docs]
     all_secs=[]
-    for d in docs:
-        pdf=os.path.join(path,'PDFs',d['filename'])
-        secs=analyzer.extract_sections(pdf)
-        for s in secs: s['document']=d['filename']
-        all_secs+=secs
+    # PDFs are parsed independently (CPU-bound): one per worker process
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        for d,secs in zip(docs,pool.map(analyzer.extract_sections,pdfs)):
+            for s in secs: s['document']=d['filename']
+            all_secs+=secs
     ranked=analyzer.rank_sections(all_secs,persona,job)
     subs=analyzer.extract_subsections(ranked,persona,job)
     out={'metadata':{